@@ -1,41 +1,211 @@
+import argparse
+import difflib
+import string
 import requests
 import json
 import os
 import re
 import subprocess
 import shutil
-import time 
+import time
 import random
+import asyncio
+import aiohttp
+import hashlib
+import mmap
+import threading
+import concurrent.futures
+import functools
+import email.utils
+from dataclasses import dataclass
 
 # ========================= CONFIGURATION =========================
 OPENSTA_PATH = "/usr/local/bin/sta"
+GEMINI_MODEL = "gemini-2.0-flash"
 DEFAULT_LIBERTY_PATH = "/Users/utkarshchoudhary/Desktop/VDAT_Code/NangateOpenCellLibrary_typical.lib"
 WORKING_DIRECTORY = "/Users/utkarshchoudhary/Desktop/VDAT_Code"
 
+# ------------------------- Compiled Regexes -------------------------
+# Hot patterns compiled once at import so per-call work skips the re cache lookup.
+
+_SDC_FENCE_RE = re.compile(r'```sdc\s*([\s\S]*?)\s*```')
+_SDC_TAG_RE = re.compile(r'<sdc>\s*([\s\S]*?)\s*</sdc>')
+_TCL_FENCE_RE = re.compile(r'```tcl\s*([\s\S]*?)\s*```')
+_TCL_TAG_RE = re.compile(r'<tcl>\s*([\s\S]*?)\s*</tcl>')
+_VERILOG_FENCE_RE = re.compile(r'```(?:system)?verilog\s*([\s\S]*?)\s*```')
+_VERILOG_TAG_RE = re.compile(r'<verilog>\s*([\s\S]*?)\s*</verilog>')
+_CODE_FENCE_RE = re.compile(r'```\s*([\s\S]*?)\s*```')
+_MODULE_BLOCK_RE = re.compile(r'(module\s+\w+[\s\S]*?endmodule)')
+_MODULE_DECL_RE = re.compile(r'module\s+(\w+)')
+_CELL_INSTANCE_RE = re.compile(r'^\s*(\w+)\s+\w+\s*\(', re.MULTILINE)
+_CELL_HEADER_RE = re.compile(r'(?<!\w)cell\s*\(\s*"?(\w+)"?\s*\)\s*\{')
+_INST_RE = re.compile(r'(\w+)_X(\d+)\s+(\w+)\s*\(')
+_SDC_COMMENT_DROP_RE = re.compile(r'^#\s*(?:set_|create_)|file for|section|definition|delay|load', re.IGNORECASE)
+_CLOCK_PERIOD_RE = re.compile(r'clock\s+period\s+(\d+\.?\d*)', re.IGNORECASE)
+_UNCERTAINTY_RE = re.compile(r'uncertainty\s+of\s+(\d+\.?\d*)', re.IGNORECASE)
+_LOG_PARSE_RE = re.compile(r'Path Type:\s*(max|min)|(-?\d+\.\d+)\s+slack(\s+\(VIOLATED\))?')
+_VIOLATED_PATH_RE = re.compile(r'Startpoint:.*?slack.*?\(VIOLATED\)', re.S)
+
 # ------------------------- Gemini API Interaction -------------------------
 
-def query_gemini(prompt, api_key, max_retries=5, retry_delay=2, timeout=60):
+# One shared session keeps the TLS connection to the Gemini host warm across
+# calls instead of paying a fresh handshake per request.
+_SESSION = requests.Session()
+_SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=0))
+_SESSION.headers.update({"Content-Type": "application/json"})
+
+class TokenBucket:
+    """Thread-safe token bucket used to pace Gemini requests client-side."""
+
+    def __init__(self, rate_per_sec, capacity):
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1, timeout=60):
+        """Block until tokens are available (or the timeout passes); returns True on success."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_sec)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                needed = (tokens - self.tokens) / self.rate_per_sec
+            if now + needed > deadline:
+                return False
+            time.sleep(needed)
+
+# Default paced to the Gemini free-tier 10 requests/minute; override with RPM env var.
+_RPM = float(os.environ.get("RPM", "10"))
+_BUCKET = TokenBucket(rate_per_sec=_RPM / 60.0, capacity=max(1, int(_RPM)))
+
+# Shared push-back window: when the API answers 429/503 with Retry-After,
+# every caller sleeps it out before sending the next request.
+_RETRY_WINDOW_LOCK = threading.Lock()
+_retry_window_until = 0.0
+
+def _note_retry_after(headers):
+    """Record a server-provided Retry-After hint in the shared push-back window."""
+    global _retry_window_until
+    header = headers.get('Retry-After')
+    if not header:
+        return
+    try:
+        wait = float(header)
+    except ValueError:
+        return
+    with _RETRY_WINDOW_LOCK:
+        _retry_window_until = max(_retry_window_until, time.monotonic() + wait)
+
+def _wait_for_rate_limit():
+    """Pace the caller: honor any server push-back window, then take a bucket token."""
+    with _RETRY_WINDOW_LOCK:
+        remaining = _retry_window_until - time.monotonic()
+    if remaining > 0:
+        # Jitter only ever extends the wait — waking before the server's
+        # window expires would just earn another 429
+        time.sleep(remaining + random.uniform(0, remaining * 0.25))
+    # Keep waiting through contention; giving up on a False return would
+    # let the caller send unthrottled, exactly when the bucket is busiest
+    while not _BUCKET.acquire(tokens=1, timeout=60):
+        pass
+
+def _retry_wait_time(headers, attempt, retry_delay, cap=30):
+    """
+    How long to sleep before the next attempt: honor a Retry-After header
+    (seconds or HTTP-date) when the server provides one, otherwise back off
+    exponentially with jitter, capped.
+    """
+    header = headers.get('Retry-After') if headers is not None else None
+    if header:
+        try:
+            return float(header) + random.uniform(0, 1)
+        except ValueError:
+            try:
+                retry_at = email.utils.parsedate_to_datetime(header)
+                return max(0.0, retry_at.timestamp() - time.time()) + random.uniform(0, 1)
+            except (TypeError, ValueError):
+                pass
+    return min(cap, retry_delay * (2 ** attempt)) + random.uniform(0, retry_delay)
+
+# Disk-backed response cache: reruns of the same design hit the cache instead
+# of the network. Opt-in via LIDER_CACHE=1 since responses are non-deterministic
+# and a user iterating on prompts usually wants fresh answers.
+GEMINI_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".lider_cache", "gemini")
+
+def _gemini_cache_enabled():
+    return os.environ.get("LIDER_CACHE", "0") != "0"
+
+def _gemini_cache_file(prompt):
+    digest = hashlib.sha256((GEMINI_MODEL + prompt).encode()).hexdigest()
+    return os.path.join(GEMINI_CACHE_DIR, f"{digest}.txt")
+
+def _gemini_cache_lookup(prompt):
+    """Return the cached response for this prompt, or None on a miss."""
+    if not _gemini_cache_enabled():
+        return None
+    try:
+        with open(_gemini_cache_file(prompt), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _gemini_cache_store(prompt, response):
+    """Atomically persist a successful response (tmp + rename)."""
+    if not _gemini_cache_enabled():
+        return
+    try:
+        os.makedirs(GEMINI_CACHE_DIR, exist_ok=True)
+        cache_file = _gemini_cache_file(prompt)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(response)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+
+def query_gemini(prompt, api_key, max_retries=5, retry_delay=2, timeout=60, deadline=None):
     """
     Send a prompt to the Gemini API and return the response.
-    Automatically retries on 503 Service Unavailable errors with exponential backoff and jitter.
+    Retries on 429/503 with capped exponential backoff and jitter, honoring
+    the server's Retry-After header when present. `deadline` bounds the total
+    time spent (time.monotonic() value, default: 180s from now); the call
+    gives up early rather than sleep past it.
     """
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
+    cached = _gemini_cache_lookup(prompt)
+    if cached is not None:
+        return cached
+
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={api_key}"
     data = {"contents": [{"parts": [{"text": prompt}]}]}
+    if deadline is None:
+        deadline = time.monotonic() + 180
 
     for attempt in range(max_retries):
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(data), timeout=timeout)
+            _wait_for_rate_limit()
+            response = _SESSION.post(url, json=data, timeout=timeout)
 
             if response.status_code == 200:
                 try:
-                    return response.json()['candidates'][0]['content']['parts'][0]['text']
+                    text = response.json()['candidates'][0]['content']['parts'][0]['text']
                 except (KeyError, IndexError):
                     return "Error parsing response."
-
-            elif response.status_code == 503:
-                wait_time = retry_delay * (attempt + 1) + random.uniform(0, 1)
-                print(f"⚠ Gemini API is overloaded (503). Retrying in {wait_time:.2f}s...")
+                _gemini_cache_store(prompt, text)
+                return text
+
+            elif response.status_code in (429, 503):
+                _note_retry_after(response.headers)
+                wait_time = _retry_wait_time(response.headers, attempt, retry_delay)
+                if time.monotonic() + wait_time > deadline:
+                    print(f"⚠ Gemini API still overloaded ({response.status_code}) and deadline reached. Giving up.")
+                    break
+                print(f"⚠ Gemini API is overloaded ({response.status_code}). Retrying in {wait_time:.2f}s...")
                 time.sleep(wait_time)
                 continue
 
@@ -43,79 +213,302 @@ def query_gemini(prompt, api_key, max_retries=5, retry_delay=2, timeout=60):
                 return f"Error: {response.status_code} - {response.text}"
 
         except requests.exceptions.RequestException as e:
-            wait_time = retry_delay * (attempt + 1) + random.uniform(0, 1)
+            wait_time = _retry_wait_time(None, attempt, retry_delay)
+            if time.monotonic() + wait_time > deadline:
+                print(f"⚠ Network error: {e}. Deadline reached, giving up.")
+                break
             print(f"⚠ Network error: {e}. Retrying in {wait_time:.2f}s...")
             time.sleep(wait_time)
 
     return "⚠ Gemini API unavailable. Please try again later."
 
+async def query_gemini_async(session, prompt, api_key, max_retries=5, retry_delay=2, timeout=60, deadline=None):
+    """
+    Async version of query_gemini using an aiohttp session.
+    Same retry policy as the sync version: capped exponential backoff with
+    jitter, Retry-After honored, bounded by `deadline`.
+    """
+    cached = _gemini_cache_lookup(prompt)
+    if cached is not None:
+        return cached
+
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={api_key}"
+    data = {"contents": [{"parts": [{"text": prompt}]}]}
+    if deadline is None:
+        deadline = time.monotonic() + 180
+
+    for attempt in range(max_retries):
+        try:
+            await asyncio.to_thread(_wait_for_rate_limit)
+            async with session.post(url, json=data, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 200:
+                    try:
+                        payload = await response.json()
+                        text = payload['candidates'][0]['content']['parts'][0]['text']
+                    except (KeyError, IndexError):
+                        return "Error parsing response."
+                    _gemini_cache_store(prompt, text)
+                    return text
+
+                elif response.status in (429, 503):
+                    _note_retry_after(response.headers)
+                    wait_time = _retry_wait_time(response.headers, attempt, retry_delay)
+                    if time.monotonic() + wait_time > deadline:
+                        print(f"⚠ Gemini API still overloaded ({response.status}) and deadline reached. Giving up.")
+                        break
+                    print(f"⚠ Gemini API is overloaded ({response.status}). Retrying in {wait_time:.2f}s...")
+                    await asyncio.sleep(wait_time)
+                    continue
+
+                else:
+                    return f"Error: {response.status} - {await response.text()}"
+
+        # ClientTimeout expiry raises a bare TimeoutError, not a ClientError
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            wait_time = _retry_wait_time(None, attempt, retry_delay)
+            if time.monotonic() + wait_time > deadline:
+                print(f"⚠ Network error: {e}. Deadline reached, giving up.")
+                break
+            print(f"⚠ Network error: {e}. Retrying in {wait_time:.2f}s...")
+            await asyncio.sleep(wait_time)
+
+    return "⚠ Gemini API unavailable. Please try again later."
+
+def query_gemini_many(prompts, api_key, concurrency=4):
+    """
+    Send several independent prompts to Gemini concurrently and return the
+    responses in the same order. Concurrency is capped with a semaphore to
+    stay within Gemini's per-model limits.
+    """
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded_query(session, prompt):
+            async with semaphore:
+                return await query_gemini_async(session, prompt, api_key)
+
+        async with aiohttp.ClientSession() as session:
+            tasks = [bounded_query(session, prompt) for prompt in prompts]
+            return await asyncio.gather(*tasks)
+
+    return asyncio.run(run_all())
+
+def submit_gemini_batch(prompts, api_key):
+    """
+    Submit a list of prompts as one Gemini Batch mode job (50% discount,
+    no latency guarantee). Returns the long-running operation name, or None
+    if submission failed.
+    """
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:batchGenerateContent?key={api_key}"
+    requests_payload = [
+        {
+            "request": {"contents": [{"parts": [{"text": prompt}]}]},
+            "metadata": {"key": str(index)},
+        }
+        for index, prompt in enumerate(prompts)
+    ]
+    data = {
+        "batch": {
+            "display_name": "lider-analysis-batch",
+            "input_config": {"requests": {"requests": requests_payload}},
+        }
+    }
+
+    try:
+        response = _SESSION.post(url, json=data, timeout=60)
+        if response.status_code == 200:
+            return response.json().get("name")
+        print(f"⚠ Batch submission failed: {response.status_code} - {response.text}")
+    except requests.exceptions.RequestException as e:
+        print(f"⚠ Network error submitting batch: {e}")
+    return None
+
+def poll_gemini_batch(job_name, api_key, poll_delay=5, max_wait=1800):
+    """
+    Poll a Gemini batch job until it completes, sleeping with exponential
+    backoff between polls. Returns the list of response texts ordered by the
+    per-request metadata key, or None on failure/timeout.
+    """
+    url = f"https://generativelanguage.googleapis.com/v1beta/{job_name}?key={api_key}"
+    deadline = time.monotonic() + max_wait
+    wait_time = poll_delay
+
+    while time.monotonic() < deadline:
+        try:
+            response = _SESSION.get(url, timeout=60)
+            if response.status_code != 200:
+                print(f"⚠ Batch polling failed: {response.status_code} - {response.text}")
+                return None
+            job = response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"⚠ Network error polling batch: {e}")
+            return None
+
+        if job.get("done"):
+            if "error" in job:
+                print(f"⚠ Batch job failed: {job['error']}")
+                return None
+            inlined = job.get("response", {}).get("inlinedResponses", {}).get("inlinedResponses", [])
+            ordered = sorted(inlined, key=lambda r: int(r.get("metadata", {}).get("key", 0)))
+            results = []
+            for entry in ordered:
+                try:
+                    results.append(entry["response"]['candidates'][0]['content']['parts'][0]['text'])
+                except (KeyError, IndexError):
+                    results.append("Error parsing response.")
+            return results
+
+        print(f"Batch job still running. Polling again in {wait_time:.0f}s...")
+        time.sleep(wait_time)
+        wait_time = min(wait_time * 2, 60)
+
+    print("⚠ Batch job timed out.")
+    return None
+
+def query_gemini_batch(prompts, api_key):
+    """
+    Run prompts through Gemini Batch mode when enabled (BATCH_MODE env var,
+    default off), falling back to concurrent interactive calls on any failure.
+    """
+    if os.environ.get("BATCH_MODE", "0") != "0":
+        job_name = submit_gemini_batch(prompts, api_key)
+        if job_name:
+            print(f"✓ Batch job submitted: {job_name}")
+            results = poll_gemini_batch(job_name, api_key)
+            if results and len(results) == len(prompts):
+                return results
+        print("⚠ Falling back to interactive Gemini calls.")
+    return query_gemini_many(prompts, api_key)
+
 # ------------------------- OpenSTA Automation -------------------------
 
 def run_opensta(tcl_file, log_file, opensta_path=OPENSTA_PATH):
-    """Execute OpenSTA with the given TCL script and capture output to log file."""
+    """
+    Execute OpenSTA with the given TCL script.
+    Stdout is streamed line-by-line: each line is teed to the log file and
+    fed to an incremental violation parser, so by the time the process
+    exits the log never has to be read back from disk.
+    Returns (success, log_content, violations).
+    """
     try:
         tcl_file = os.path.abspath(tcl_file)
         log_file = os.path.abspath(log_file)
         tcl_dir = os.path.dirname(tcl_file)
-        
+
         print(f"\nRunning OpenSTA command:")
         print(f"cd {tcl_dir} && {opensta_path} -exit {os.path.basename(tcl_file)}\n")
-        
-        cmd = f"cd {tcl_dir} && {opensta_path} -exit {os.path.basename(tcl_file)}"
-        
+
+        # argv list with cwd= skips the intermediate shell (one fork+exec fewer,
+        # and paths with spaces are safe)
+        cmd = [opensta_path, "-exit", os.path.basename(tcl_file)]
+
+        parser = TimingLogParser()
+        lines = []
         with open(log_file, "w") as logfile:
-            result = subprocess.run(
+            # stderr merged into stdout: errors land in the log in order, and
+            # a chatty stderr can never fill its pipe and stall the process
+            # while we are blocked reading stdout.
+            process = subprocess.Popen(
                 cmd,
-                shell=True,
-                stdout=logfile,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=120
+                cwd=tcl_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True
             )
-        
-        log_content = read_file(log_file)
-        
-        if result.returncode == 0:
+            # The tee loop runs in a thread so the wall-clock bound below
+            # covers a hung or silent sta too, not just a chatty one: wait()
+            # times out, the kill closes the pipe and the reader sees EOF.
+            def drain_stdout():
+                for line in process.stdout:
+                    logfile.write(line)
+                    lines.append(line)
+                    parser.feed(line)
+
+            reader = threading.Thread(target=drain_stdout, daemon=True)
+            reader.start()
+            try:
+                process.wait(timeout=120)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                raise
+            finally:
+                reader.join(timeout=5)
+
+        log_content = ''.join(lines)
+
+        if process.returncode == 0:
             print(f"✓ OpenSTA finished successfully. Output saved to:\n{log_file}\n")
-            return True, log_content
+            return True, log_content, parser.result()
         else:
-            print(f"✗ OpenSTA encountered an error. Return code: {result.returncode}")
-            if result.stderr:
-                print(f"STDERR: {result.stderr}")
+            print(f"✗ OpenSTA encountered an error. Return code: {process.returncode}")
             print(f"Check the log at:\n{log_file}\n")
-            return False, log_content
-            
+            return False, log_content, parser.result()
+
     except Exception as e:
         print(f"✗ Exception occurred while running OpenSTA: {e}")
-        return False, None
+        return False, None, None
     
 # ------------------------- File Handling -------------------------
 
-def read_file(file_path):
-    """Read a file and return its contents as a string."""
+def read_file(file_path, max_bytes=None):
+    """
+    Read a file and return its contents as a string.
+    When max_bytes is set, only that many bytes are read and decoded —
+    useful for large files where only a bounded prefix is ever used.
+    """
     try:
         with open(file_path, 'r', encoding="utf-8") as file:
-            return file.read()
+            return file.read(max_bytes) if max_bytes else file.read()
     except Exception as e:
         print(f"Error reading file {file_path}: {e}")
         return None
 
 def write_file(file_path, content):
-    """Write content to a file."""
+    """
+    Write content to a file: encode to bytes once, write in binary mode
+    (no newline translation), then rename into place so a killed process
+    never leaves a half-written file behind.
+    """
     try:
-        with open(file_path, 'w', encoding="utf-8") as file:
-            file.write(content)
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        tmp_path = f"{file_path}.tmp"
+        # Raw fd instead of a buffered file object: one write syscall for the
+        # common case, looping only if the kernel takes a partial write.
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, file_path)
         print(f"✓ Successfully wrote to {file_path}")
         return True
     except Exception as e:
         print(f"✗ Error writing to file {file_path}: {e}")
         return False
 
+def fast_copy(src, dst):
+    """
+    Copy src to dst, skipping the copy entirely when dst already looks
+    current (same size, not older than src). shutil.copyfile uses
+    sendfile(2) on Linux and skips copy2's extra metadata stat/chmod —
+    this matters for the multi-MB liberty file copied on every run.
+    """
+    src_stat = os.stat(src)
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        dst_stat = None
+    if dst_stat and dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime >= src_stat.st_mtime:
+        return
+    shutil.copyfile(src, dst)
+
 # ------------------------- Gemini Analysis Functions -------------------------
 
-def analyze_verilog_with_gemini(design_content, api_key):
-    """Use Gemini API to analyze a Verilog design file."""
-    prompt = f"""
+def build_verilog_analysis_prompt(design_content):
+    """Build the prompt used to analyze a Verilog design file."""
+    return f"""
 You are an expert in ASIC design and Verilog HDL. I need a detailed analysis of the following Verilog design.
 Please provide a comprehensive report that includes:
 
@@ -137,11 +530,14 @@ Here is the Verilog design:
 
 Provide your analysis in a structured, detailed report format.
 """
-    return query_gemini(prompt, api_key)
 
-def analyze_liberty_with_gemini(design_content, liberty_content, api_key):
-    """Use Gemini API to analyze cells in a Liberty file that are used in the Verilog design."""
-    prompt = f"""
+def analyze_verilog_with_gemini(design_content, api_key):
+    """Use Gemini API to analyze a Verilog design file."""
+    return query_gemini(build_verilog_analysis_prompt(design_content), api_key)
+
+def build_liberty_analysis_prompt(design_content, liberty_content):
+    """Build the prompt used to analyze the Liberty cells referenced by the design."""
+    return f"""
 You are an expert in ASIC design, Liberty format (.lib files), and Verilog HDL. 
 
 I need you to perform a comprehensive analysis of the Liberty file cells that are used in the provided Verilog design.
@@ -170,153 +566,148 @@ Here is the Liberty file (note that it might be large, so analyze what you can w
 Please provide a detailed analysis focusing specifically on the cells that appear in the Verilog design.
 If the Liberty file is truncated and you cannot find a specific cell, please mention this in your analysis.
 """
-    return query_gemini(prompt, api_key)
+
+def analyze_liberty_with_gemini(design_content, liberty_content, api_key):
+    """Use Gemini API to analyze cells in a Liberty file that are used in the Verilog design."""
+    return query_gemini(build_liberty_analysis_prompt(design_content, liberty_content), api_key)
 
 # ------------------------- SDC and TCL Extraction -------------------------
 
 def extract_sdc_code(response):
     """Extract SDC code from Gemini's response."""
-    sdc_match = re.search(r'```sdc\s*([\s\S]*?)\s*```', response)
+    sdc_match = _SDC_FENCE_RE.search(response)
     if sdc_match:
         return sdc_match.group(1).strip()
-    
-    alt_match = re.search(r'<sdc>\s*([\s\S]*?)\s*</sdc>', response)
+
+    alt_match = _SDC_TAG_RE.search(response)
     if alt_match:
         return alt_match.group(1).strip()
-    
-    code_block = re.search(r'```\s*([\s\S]*?)\s*```', response)
+
+    code_block = _CODE_FENCE_RE.search(response)
     if code_block:
         return code_block.group(1).strip()
-    
+
     return response.strip()
 
 def extract_tcl_code(response):
     """Extract TCL code from Gemini's response."""
-    tcl_match = re.search(r'```tcl\s*([\s\S]*?)\s*```', response)
+    tcl_match = _TCL_FENCE_RE.search(response)
     if tcl_match:
         return tcl_match.group(1).strip()
-    
-    alt_match = re.search(r'<tcl>\s*([\s\S]*?)\s*</tcl>', response)
+
+    alt_match = _TCL_TAG_RE.search(response)
     if alt_match:
         return alt_match.group(1).strip()
-    
-    code_block = re.search(r'```\s*([\s\S]*?)\s*```', response)
+
+    code_block = _CODE_FENCE_RE.search(response)
     if code_block and "read_verilog" in code_block.group(1):
         return code_block.group(1).strip()
-    
+
     return None
 
 def extract_verilog_code(response):
     """Extract Verilog code from Gemini's response."""
-    verilog_match = re.search(r'```verilog\s*([\s\S]*?)\s*```', response)
+    verilog_match = _VERILOG_FENCE_RE.search(response)
     if verilog_match:
         return verilog_match.group(1).strip()
-    
-    alt_match = re.search(r'<verilog>\s*([\s\S]*?)\s*</verilog>', response)
+
+    alt_match = _VERILOG_TAG_RE.search(response)
     if alt_match:
         return alt_match.group(1).strip()
-    
-    module_match = re.search(r'(module\s+\w+[\s\S]*?endmodule)', response)
+
+    module_match = _MODULE_BLOCK_RE.search(response)
     if module_match:
         return module_match.group(1).strip()
-    
+
     return None
 
 # ------------------------- SDC and TCL Post-Processing -------------------------
 
 def post_process_sdc(sdc_content, sdc_requirement):
     """Post-process the SDC file to remove unnecessary commands and fix common issues."""
-    lines = sdc_content.strip().split('\n')
+    requirement_lower = sdc_requirement.lower()
+    keep_driving = 'drive' in requirement_lower
+    keep_load = 'load' in requirement_lower
+
     processed_lines = []
-    seen_commands = set()
-    
-    for line in lines:
+    seen_commands = {}
+
+    for line in sdc_content.strip().split('\n'):
         stripped = line.strip()
-        if not stripped or (stripped.startswith('#') and 
-                           any(x in stripped.lower() for x in ['file for', 'section', 'definition', 'delay', 'load'])):
-            continue
-        
-        if stripped.startswith('# set_') or stripped.startswith('# create_'):
+        if not stripped:
             continue
-            
-        cmd_match = re.match(r'(\w+)\s+([^-\s]+)', stripped)
-        if cmd_match and not stripped.startswith('#'):
-            cmd_type = cmd_match.group(1)
-            cmd_key = f"{cmd_type}:{stripped}"
-            if cmd_key in seen_commands:
+
+        if stripped.startswith('#'):
+            if _SDC_COMMENT_DROP_RE.search(stripped):
                 continue
-            seen_commands.add(cmd_key)
-        
-        # Do NOT convert units - keep exactly what Gemini returns
-        # Gemini is already instructed to use the correct units from requirements
-        
-        if 'set_driving_cell' in stripped and 'drive' not in sdc_requirement.lower():
-            continue
-        if 'set_load' in stripped and 'load' not in sdc_requirement.lower():
-            continue
-        
+        else:
+            # Do NOT convert units - keep exactly what Gemini returns
+            # Gemini is already instructed to use the correct units from requirements
+            if not keep_driving and 'set_driving_cell' in stripped:
+                continue
+            if not keep_load and 'set_load' in stripped:
+                continue
+            if stripped in seen_commands:
+                continue
+            seen_commands[stripped] = None
+
         processed_lines.append(stripped)
-    
+
     return '\n'.join(processed_lines)
 
-def post_process_tcl(tcl_content, design_name, sdc_file, liberty_file):
-    """Post-process the TCL script."""
-    template = f"""
+# One template for every TCL script the tool emits: the slots are the only
+# thing that varies, so output is deterministic byte-for-byte for a given
+# input — which also keeps the disk caches keyed on it stable.
+_TCL_TEMPLATE = string.Template("""
 # Read liberty file
-read_liberty {liberty_file}
+read_liberty $liberty
 
 # Read the design file
-read_verilog {design_name}.v
+read_verilog $design
 
 # Link the design
-link_design {design_name}
+link_design $top
 
 # Read the SDC constraints
-read_sdc {os.path.basename(sdc_file)}
-
-# Report setup path (max delay)
-puts "\\nSetup Path Analysis:"
-report_checks -path_delay max
-
-# Report hold path (min delay)
-puts "\\nHold Path Analysis:"
-report_checks -path_delay min
+read_sdc $sdc
 
+$reports
 # Exit OpenSTA
 exit
-"""
-    return template
+""")
+
+def post_process_tcl(tcl_content, design_name, sdc_file, liberty_file):
+    """Post-process the TCL script."""
+    return _TCL_TEMPLATE.substitute(
+        liberty=liberty_file,
+        design=f"{design_name}.v",
+        top=design_name,
+        sdc=os.path.basename(sdc_file),
+        reports='# Report setup path (max delay)\n'
+                'puts "\\nSetup Path Analysis:"\n'
+                'report_checks -path_delay max\n'
+                '\n'
+                '# Report hold path (min delay)\n'
+                'puts "\\nHold Path Analysis:"\n'
+                'report_checks -path_delay min\n',
+    )
 
 def create_default_tcl(design_file, sdc_file, liberty_file, design_name):
     """Create a default TCL script."""
-    design_path = os.path.basename(design_file)
-    sdc_path = os.path.basename(sdc_file)
-    
-    return f"""
-# Read liberty file
-read_liberty {liberty_file}
-
-# Read the design file
-read_verilog {design_path}
-
-# Link the design
-link_design {design_name}
-
-# Read the SDC constraints
-read_sdc {sdc_path}
-
-# Report timing checks
-report_checks -path_delay max
-report_checks -path_delay min
-
-# Exit OpenSTA
-exit
-"""
-
+    return _TCL_TEMPLATE.substitute(
+        liberty=liberty_file,
+        design=os.path.basename(design_file),
+        top=design_name,
+        sdc=os.path.basename(sdc_file),
+        reports='# Report timing checks\n'
+                'report_checks -path_delay max\n'
+                'report_checks -path_delay min\n',
+    )
+
+@functools.lru_cache(maxsize=8)
 def get_top_module_name(design_content):
-    """Extract the top module name from Verilog design content."""
-    pattern = r'module\s+(\w+)'
-    match = re.search(pattern, design_content)
+    """Extract the top module name from Verilog design content (memoized)."""
+    match = _MODULE_DECL_RE.search(design_content)
     if match:
         return match.group(1)
     return "top_module"
@@ -325,10 +716,10 @@ def get_top_module_name(design_content):
 
 def create_initial_prompt(design_content, sdc_requirement, liberty_file):
     """Generate initial prompt for Gemini to create SDC and TCL files."""
-    clock_period_match = re.search(r'clock\s+period\s+(\d+\.?\d*)', sdc_requirement, re.IGNORECASE)
+    clock_period_match = _CLOCK_PERIOD_RE.search(sdc_requirement)
     clock_period = clock_period_match.group(1) if clock_period_match else "UNKNOWN"
-    
-    uncertainty_match = re.search(r'uncertainty\s+of\s+(\d+\.?\d*)', sdc_requirement, re.IGNORECASE)
+
+    uncertainty_match = _UNCERTAINTY_RE.search(sdc_requirement)
     uncertainty = uncertainty_match.group(1) if uncertainty_match else "UNKNOWN"
     
     return f"""
@@ -366,95 +757,276 @@ Please provide:
 
 # ------------------------- Cell Extraction -------------------------
 
+@functools.lru_cache(maxsize=8)
+def _used_cells_cached(verilog: str):
+    cells = {match.group(1) for match in _CELL_INSTANCE_RE.finditer(verilog)
+             if match.group(1).lower() != "module"}
+    return tuple(sorted(cells))
+
 def extract_used_cells_from_verilog(verilog: str):
-    """Extract all unique standard cell types used in the Verilog file."""
-    pattern = re.compile(r'^\s*(\w+)\s+\w+\s*\(', re.MULTILINE)
-    used = sorted(set(pattern.findall(verilog)))
-    return [cell for cell in used if cell.lower() != "module"]
+    """Extract all unique standard cell types used in the Verilog file (memoized)."""
+    return list(_used_cells_cached(verilog))
 
-def extract_cells_from_liberty(liberty: str, target_cells: list) -> str:
-    """Extract complete cell blocks for only the used cells."""
+_CELL_HEADER_RE_BYTES = re.compile(_CELL_HEADER_RE.pattern.encode())
+
+def _find_cell_block_end(liberty, pos: int) -> int:
+    """Walk from just inside a cell's opening brace to the offset past its matching close."""
+    if isinstance(liberty, str):
+        open_brace, close_brace = '{', '}'
+    else:
+        open_brace, close_brace = b'{', b'}'
+    depth = 1
+    while depth > 0:
+        open_pos = liberty.find(open_brace, pos)
+        close_pos = liberty.find(close_brace, pos)
+        if close_pos == -1:
+            break
+        if open_pos != -1 and open_pos < close_pos:
+            depth += 1
+            pos = open_pos + 1
+        else:
+            depth -= 1
+            pos = close_pos + 1
+    return pos
 
+def extract_cells_from_liberty(liberty: str, target_cells: list) -> str:
+    """Extract complete cell blocks for only the used cells in one pass over the raw string."""
+    targets = set(target_cells)
+    if not targets:
+        return ''
     result = []
-    inside_cell = False
-    brace_count = 0
-    current_block = []
-
-    for line in liberty.splitlines():
-        line_stripped = line.strip()
-
-        if not inside_cell:
-            match = re.match(r'cell\s*\(\s*"?(\w+)"?\s*\)\s*\{', line_stripped)
-            if match:
-                cell_name = match.group(1)
-                if cell_name in target_cells:
-                    inside_cell = True
-                    brace_count = 1
-                    current_block = [line]
-                continue
 
-        elif inside_cell:
-            brace_count += line.count('{') - line.count('}')
-            current_block.append(line)
-            if brace_count == 0:
-                result.append('\n'.join(current_block))
-                inside_cell = False
-                current_block = []
+    for match in _CELL_HEADER_RE.finditer(liberty):
+        if match.group(1) not in targets:
+            continue
+        end = _find_cell_block_end(liberty, match.end())
+        result.append(liberty[match.start():end])
 
     return '\n\n'.join(result)
 
-def get_minimal_liberty_for_timing_fixes(verilog: str, liberty: str) -> str:
-    """Extract minimal cell information needed for timing fixes."""
+LIBCACHE_DIR = os.path.join(os.path.expanduser("~"), ".lider_cache", "libcache")
+
+def _index_liberty_cells(liberty) -> dict:
+    """Build a {cell_name: (start, end)} offset index over a liberty string or buffer."""
+    if isinstance(liberty, str):
+        header_re = _CELL_HEADER_RE
+        decode = lambda name: name
+    else:
+        header_re = _CELL_HEADER_RE_BYTES
+        decode = lambda name: name.decode('ascii', errors='ignore')
+
+    index = {}
+    for match in header_re.finditer(liberty):
+        index[decode(match.group(1))] = (match.start(), _find_cell_block_end(liberty, match.end()))
+    return index
+
+def _load_liberty_cell_index(liberty_path, mtime_ns, liberty) -> dict:
+    """Load the cached cell-offset index for a liberty file, building it on first touch."""
+    index_key = hashlib.blake2b(f"{liberty_path}:{mtime_ns}".encode()).hexdigest()
+    index_file = os.path.join(LIBCACHE_DIR, f"{index_key}.idx.json")
+
+    try:
+        with open(index_file, 'r', encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    index = _index_liberty_cells(liberty)
+    try:
+        os.makedirs(LIBCACHE_DIR, exist_ok=True)
+        with open(index_file, 'w', encoding="utf-8") as f:
+            json.dump(index, f)
+    except OSError:
+        pass
+    return index
+
+# In-process memo for the filtered liberty, keyed by content hashes so the
+# fix loop doesn't even touch the disk cache between iterations.
+_MINIMAL_LIBERTY_MEMO = {}
+
+def get_minimal_liberty_for_timing_fixes(verilog: str, liberty: str = None, liberty_path=None) -> str:
+    """
+    Extract minimal cell information needed for timing fixes.
+    When liberty_path is given, the library is memory-mapped instead of
+    decoded into a giant string and results are cached on disk keyed by
+    (path, mtime, used cells), so repeat invocations on the same library
+    become O(1) lookups instead of full rescans.
+    """
     used_cells = extract_used_cells_from_verilog(verilog)
-    return extract_cells_from_liberty(liberty, used_cells)
+    verilog_digest = hashlib.blake2b(verilog.encode(), digest_size=16).digest()
+
+    if len(_MINIMAL_LIBERTY_MEMO) > 16:
+        _MINIMAL_LIBERTY_MEMO.clear()
+
+    if liberty_path and os.path.exists(liberty_path):
+        mtime_ns = os.stat(liberty_path).st_mtime_ns
+        memo_key = (verilog_digest, liberty_path, mtime_ns)
+        cached = _MINIMAL_LIBERTY_MEMO.get(memo_key)
+        if cached is not None:
+            return cached
+
+        key = hashlib.blake2b(
+            f"{liberty_path}:{mtime_ns}:{','.join(sorted(used_cells))}".encode()
+        ).hexdigest()
+        cache_file = os.path.join(LIBCACHE_DIR, f"{key}.scl")
+
+        try:
+            with open(cache_file, 'r', encoding="utf-8") as f:
+                result = f.read()
+            _MINIMAL_LIBERTY_MEMO[memo_key] = result
+            return result
+        except OSError:
+            pass
+
+        try:
+            with open(liberty_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    index = _load_liberty_cell_index(liberty_path, mtime_ns, mm)
+                    result = '\n\n'.join(
+                        mm[start:end].decode('utf-8', errors='ignore')
+                        for cell, (start, end) in sorted(index.items(), key=lambda item: item[1][0])
+                        if cell in used_cells
+                    )
+        except (OSError, ValueError) as e:
+            print(f"Error reading file {liberty_path}: {e}")
+            if liberty is None:
+                return None
+            return extract_cells_from_liberty(liberty, used_cells)
+
+        try:
+            os.makedirs(LIBCACHE_DIR, exist_ok=True)
+            with open(cache_file, 'w', encoding="utf-8") as f:
+                f.write(result)
+        except OSError:
+            pass
+        _MINIMAL_LIBERTY_MEMO[memo_key] = result
+        return result
+
+    if liberty is None:
+        print(f"Error reading file {liberty_path}: file not found")
+        return None
+
+    memo_key = (verilog_digest, hashlib.blake2b(liberty.encode(), digest_size=16).digest())
+    cached = _MINIMAL_LIBERTY_MEMO.get(memo_key)
+    if cached is None:
+        cached = extract_cells_from_liberty(liberty, used_cells)
+        _MINIMAL_LIBERTY_MEMO[memo_key] = cached
+    return cached
 
 # ------------------------- Timing Violation Detection -------------------------
 
-def parse_log_for_timing_violations(log_content):
-    """Parse the OpenSTA log to identify setup and hold violations."""
-    violations = {
-        'setup': [],
-        'hold': [],
-        'has_violations': False,
-        'worst_setup_slack': None,
-        'worst_hold_slack': None,
-    }
-    
-    violated_matches = re.findall(r'(-?\d+\.\d+)\s+slack\s+\(VIOLATED\)', log_content)
-    if violated_matches:
-        violations['has_violations'] = True
-    
-    setup_sections = re.findall(r'Path Type: max(.*?)(?:Path Type:|$)', log_content, re.DOTALL)
-    for section in setup_sections:
-        slack_match = re.search(r'(-?\d+\.\d+)\s+slack', section)
-        if slack_match:
-            slack = float(slack_match.group(1))
-            if violations['worst_setup_slack'] is None or slack < violations['worst_setup_slack']:
-                violations['worst_setup_slack'] = slack
-            
-            if slack < 0 or "VIOLATED" in section:
+class TimingLogParser:
+    """
+    Incremental OpenSTA log parser: feed() chunks (lines or whole logs) as
+    they arrive. "Path Type:" markers switch the state and the first slack
+    after each marker is recorded under the active path type.
+    """
+
+    def __init__(self):
+        self.violations = {
+            'setup': [],
+            'hold': [],
+            'has_violations': False,
+            'worst_setup_slack': None,
+            'worst_hold_slack': None,
+        }
+        self._path_type = None
+        self._slack_recorded = False
+
+    def feed(self, text):
+        violations = self.violations
+        for match in _LOG_PARSE_RE.finditer(text):
+            if match.group(1):
+                self._path_type = match.group(1)
+                self._slack_recorded = False
+                continue
+
+            slack = float(match.group(2))
+            violated = match.group(3) is not None
+            if violated:
                 violations['has_violations'] = True
-                violations['setup'].append({'slack': slack})
-    
-    hold_sections = re.findall(r'Path Type: min(.*?)(?:Path Type:|$)', log_content, re.DOTALL)
-    for section in hold_sections:
-        slack_match = re.search(r'(-?\d+\.\d+)\s+slack', section)
-        if slack_match:
-            slack = float(slack_match.group(1))
-            if violations['worst_hold_slack'] is None or slack < violations['worst_hold_slack']:
-                violations['worst_hold_slack'] = slack
-            
-            if slack < 0 or "VIOLATED" in section:
+
+            if self._path_type is None or self._slack_recorded:
+                continue
+            self._slack_recorded = True
+
+            if self._path_type == "max":
+                worst_key, bucket = 'worst_setup_slack', 'setup'
+            else:
+                worst_key, bucket = 'worst_hold_slack', 'hold'
+
+            if violations[worst_key] is None or slack < violations[worst_key]:
+                violations[worst_key] = slack
+
+            if slack < 0 or violated:
                 violations['has_violations'] = True
-                violations['hold'].append({'slack': slack})
-    
-    return violations
+                violations[bucket].append({'slack': slack})
+
+    def result(self):
+        return self.violations
+
+def parse_log_for_timing_violations(log_content):
+    """Parse the OpenSTA log to identify setup and hold violations."""
+    parser = TimingLogParser()
+    parser.feed(log_content)
+    return parser.result()
+
+def parse_log_file_for_timing_violations(log_path):
+    """
+    Same as parse_log_for_timing_violations, but streams an on-disk log
+    line-by-line so the file is never held in memory whole. Useful for
+    re-parsing old logs; live runs are already parsed in-stream by
+    run_opensta.
+    """
+    parser = TimingLogParser()
+    with open(log_path) as f:
+        for line in f:
+            parser.feed(line)
+    return parser.result()
 
 # ------------------------- Timing Violation Fixing -------------------------
 
-def fix_timing_violations_with_gemini(design_content, timing_analysis, liberty_content, api_key, 
-                                     fix_history=None, iteration=1, violations_history=None):
-    """Use Gemini API to generate fixes for timing violations in the design."""
+@dataclass
+class PromptCache:
+    """
+    Static fragments of the timing-fix prompt, sliced once per run instead of
+    per iteration (the design/liberty prefixes alone are tens of KB each).
+    """
+    design_prefix: str
+    liberty_first_prefix: str
+    liberty_prefix: str
+
+    @classmethod
+    def from_contents(cls, design_content, liberty_content):
+        # Slice the larger liberty prefix once and carve the smaller one out
+        # of it, so the source string is only walked a single time.
+        liberty_first_prefix = liberty_content[:50000]
+        return cls(design_content[:20000], liberty_first_prefix, liberty_first_prefix[:30000])
+
+def _design_diff(original, revised, label):
+    """Unified diff of a revised netlist against the original, for prompts."""
+    return "\n".join(difflib.unified_diff(
+        original.splitlines(), revised.splitlines(),
+        fromfile="original", tofile=label, n=3, lineterm=""))
+
+def _violated_path_excerpt(log_content, limit=5):
+    """
+    The first few VIOLATED path blocks of an STA log — the part Gemini
+    actually needs — falling back to a bounded prefix when none can be
+    isolated.
+    """
+    blocks = _VIOLATED_PATH_RE.findall(log_content)
+    if blocks:
+        return "\n\n".join(blocks[:limit])
+    return log_content[:10000]
+
+def build_fix_prompt(design_content, timing_analysis, liberty_content,
+                     fix_history=None, iteration=1, violations_history=None, strategy=None,
+                     prompt_cache=None):
+    """Build the prompt asking Gemini to fix timing violations in the design."""
+    if prompt_cache is None:
+        prompt_cache = PromptCache.from_contents(design_content, liberty_content)
+
     if iteration == 1 or not fix_history:
         prompt = f"""
 You are an expert in ASIC design, Verilog HDL, and static timing analysis. I need you to fix timing violations in a Verilog design based on OpenSTA timing analysis.
@@ -471,7 +1043,7 @@ Now, examine the timing analysis report identifying violations:
 
 I also provide the Liberty file for reference (partial):
 ```liberty
-{liberty_content[:50000]}
+{prompt_cache.liberty_first_prefix}
 ```
 
 Based on these, please:
@@ -525,10 +1097,19 @@ Your previous changes have {setup_trend.lower()} setup timing and {hold_trend.lo
                 best_setup_slack = hist['setup_slack']
                 best_iteration = i
         
-        best_design = fix_history[best_iteration]['design']
-        current_design = fix_history[-1]['design']
-        
-        prompt = f"""
+        # History entries carry a path, not the netlist itself; read lazily
+        # only the two designs the prompt actually uses. Past iteration 1 the
+        # revisions go in as unified diffs against the original and the log as
+        # just its violated paths — roughly a 10x token cut on large netlists.
+        best_design = read_file(fix_history[best_iteration]['path']) or ""
+        current_design = read_file(fix_history[-1]['path']) or ""
+        best_diff = _design_diff(design_content, best_design, f"iteration_{best_iteration+1}")
+        current_diff = _design_diff(design_content, current_design, f"iteration_{iteration-1}")
+
+        # str.join on chunks beats one giant f-string re-concatenating the
+        # large cached prefixes every iteration
+        prompt = "".join([
+            f"""
 You are an expert in ASIC design, Verilog HDL, and static timing analysis.
 
 ITERATION {iteration}: Previous fixes have been applied but violations still exist.
@@ -537,29 +1118,39 @@ ITERATION {iteration}: Previous fixes have been applied but violations still exi
 
 **Original Design:**
 ```verilog
-{design_content[:20000]}
+""",
+            prompt_cache.design_prefix,
+            f"""
 ```
 
-**Most Successful Design (Iteration {best_iteration+1}):**
-```verilog
-{best_design}
+**Most Successful Design (Iteration {best_iteration+1}), as a diff against the original:**
+```diff
+""",
+            best_diff,
+            f"""
 ```
 
-**Current Design (Iteration {iteration-1}):**
-```verilog
-{current_design}
+**Current Design (Iteration {iteration-1}), as a diff against the original:**
+```diff
+""",
+            current_diff,
+            f"""
 ```
 
 {history_context}
 
-**Current Timing Analysis Report:**
+**Worst VIOLATED Timing Paths:**
 ```
-{timing_analysis[:10000]}
+""",
+            _violated_path_excerpt(timing_analysis),
+            """
 ```
 
 **Liberty File Reference (partial):**
 ```liberty
-{liberty_content[:30000]}
+""",
+            prompt_cache.liberty_prefix,
+            """
 ```
 
 Based on this:
@@ -576,70 +1167,517 @@ CRITICALLY IMPORTANT:
 4. Explain why your changes should improve the situation
 
 Provide the COMPLETE updated Verilog design inside ```verilog and ``` tags.
-"""
-    return query_gemini(prompt, api_key)
+""",
+        ])
+
+    if strategy:
+        prompt += f"\nPREFERRED FIX STRATEGY FOR THIS ATTEMPT:\n{strategy}\n"
+    return prompt
+
+def fix_timing_violations_with_gemini(design_content, timing_analysis, liberty_content, api_key,
+                                     fix_history=None, iteration=1, violations_history=None,
+                                     prompt_cache=None, deadline=None):
+    """Use Gemini API to generate fixes for timing violations in the design."""
+    prompt = build_fix_prompt(design_content, timing_analysis, liberty_content,
+                              fix_history=fix_history, iteration=iteration,
+                              violations_history=violations_history,
+                              prompt_cache=prompt_cache)
+    return query_gemini(prompt, api_key, deadline=deadline)
+
+# Alternative fix angles used when evaluating several candidates per iteration.
+FIX_STRATEGIES = [
+    "Prefer cell resizing: swap cells on the violating paths to higher drive strengths (X2/X4) without adding new cells.",
+    "Prefer buffer insertion: add buffer cells to isolate heavy loads and break up long wires on the violating paths.",
+    "Prefer restructuring: rebalance or restructure the logic on the critical paths to shorten the worst path.",
+]
+
+def generate_candidate_fixes(design_content, timing_analysis, liberty_content, api_key,
+                             fix_history=None, iteration=1, violations_history=None,
+                             num_candidates=3, prompt_cache=None):
+    """
+    Request several alternative fixes from Gemini in one concurrent batch,
+    one per fix strategy, and return the extracted candidate designs with
+    their raw responses.
+    """
+    prompts = [
+        build_fix_prompt(design_content, timing_analysis, liberty_content,
+                         fix_history=fix_history, iteration=iteration,
+                         violations_history=violations_history,
+                         strategy=FIX_STRATEGIES[k % len(FIX_STRATEGIES)],
+                         prompt_cache=prompt_cache)
+        for k in range(num_candidates)
+    ]
+    responses = query_gemini_batch(prompts, api_key)
+
+    candidates = []
+    for response in responses:
+        extracted = extract_verilog_code(response)
+        if extracted:
+            candidates.append((extracted, response))
+    return candidates
+
+def evaluate_candidate_designs(candidate_designs, work_root, design_basename,
+                               tcl_file, sdc_file, liberty_file):
+    """
+    Run OpenSTA on each candidate design concurrently (one isolated work dir
+    per candidate) and return (best_index, best_violations, best_log) by
+    worst setup slack, or (None, None, None) if every run failed.
+    """
+    jobs = []
+    for k, design in enumerate(candidate_designs):
+        cand_dir = os.path.join(work_root, f"cand_{k + 1}")
+        os.makedirs(cand_dir, exist_ok=True)
+        write_file(os.path.join(cand_dir, design_basename), design)
+
+        for support in (tcl_file, sdc_file, liberty_file):
+            dst = os.path.join(cand_dir, os.path.basename(support))
+            if not os.path.exists(dst):
+                try:
+                    os.symlink(os.path.abspath(support), dst)
+                except OSError:
+                    fast_copy(support, dst)
+
+        jobs.append((os.path.join(cand_dir, os.path.basename(tcl_file)),
+                     os.path.join(cand_dir, "sta.log")))
+
+    results = [None] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+        futures = {executor.submit(run_opensta, tcl, log): k for k, (tcl, log) in enumerate(jobs)}
+        for future in concurrent.futures.as_completed(futures):
+            k = futures[future]
+            try:
+                results[k] = future.result()
+            except Exception as e:
+                print(f"✗ Candidate {k + 1} OpenSTA run failed: {e}")
+                results[k] = (False, None, None)
+
+    best_index, best_slack, best_violations, best_log = None, -float('inf'), None, None
+    for k, result in enumerate(results):
+        if not result or not result[0] or not result[2]:
+            continue
+        violations = result[2]
+        slack = violations['worst_setup_slack']
+        if slack is not None and slack > best_slack:
+            best_index, best_slack, best_violations, best_log = k, slack, violations, result[1]
+    return best_index, best_violations, best_log
+
+def _extract_instantiations(design):
+    """Map instance name to (cell type, drive strength) in one regex sweep."""
+    return {match.group(3): (match.group(1), match.group(2))
+            for match in _INST_RE.finditer(design)}
 
 def summarize_changes(original_design, new_design):
     """Generate a summary of changes between original and new design."""
-    def extract_instantiations(design):
-        instantiations = {}
-        pattern = r'(\w+)_X(\d+)\s+(\w+)\s*\('
-        matches = re.finditer(pattern, design)
-        for match in matches:
-            cell_type = match.group(1)
-            drive_strength = match.group(2)
-            instance_name = match.group(3)
-            instantiations[instance_name] = {
-                'type': cell_type,
-                'strength': drive_strength
-            }
-        return instantiations
-    
-    orig_inst = extract_instantiations(original_design)
-    new_inst = extract_instantiations(new_design)
-    
+    if original_design is new_design or original_design == new_design:
+        return "No significant changes detected"
+
+    # Set-of-line-hashes diff is O(N+M) and catches whitespace/comment-only
+    # rewrites that the instance walk below would miss.
+    orig_lines = {hash(line) for line in original_design.splitlines()}
+    new_lines = {hash(line) for line in new_design.splitlines()}
+    added = len(new_lines - orig_lines)
+    removed = len(orig_lines - new_lines)
+    if added == 0 and removed == 0:
+        return "No significant changes detected"
+
+    orig_inst = _extract_instantiations(original_design)
+    new_inst = _extract_instantiations(new_design)
+
     changes = []
-    
-    for inst_name, orig_info in orig_inst.items():
-        if inst_name in new_inst:
-            new_info = new_inst[inst_name]
+    for inst_name in sorted(orig_inst.keys() | new_inst.keys()):
+        orig_info = orig_inst.get(inst_name)
+        new_info = new_inst.get(inst_name)
+        if orig_info and new_info:
             if orig_info != new_info:
-                changes.append(f"Changed {inst_name} from {orig_info['type']}_X{orig_info['strength']} to {new_info['type']}_X{new_info['strength']}")
-    
-    for inst_name, new_info in new_inst.items():
-        if inst_name not in orig_inst:
-            changes.append(f"Added {inst_name} ({new_info['type']}_X{new_info['strength']})")
-    
-    for inst_name in orig_inst:
-        if inst_name not in new_inst:
+                changes.append(f"Changed {inst_name} from {orig_info[0]}_X{orig_info[1]} to {new_info[0]}_X{new_info[1]}")
+        elif new_info:
+            changes.append(f"Added {inst_name} ({new_info[0]}_X{new_info[1]})")
+        else:
             changes.append(f"Removed {inst_name}")
-    
-    return "; ".join(changes) if changes else "No significant changes detected"
+
+    changes.append(f"+{added} -{removed} lines")
+    return "; ".join(changes)
+
+# ------------------------- Iterative Fix Loop -------------------------
+
+def run_fix_iterations(design_content, liberty_content, api_key, design_name, design_dir,
+                       iterations_dir, output_design_file, tcl_file, sdc_file, liberty_name,
+                       num_iterations):
+    """
+    Run the iterative STA + violation-fixing loop shared by the standalone
+    timing-fix flow and the full pipeline: write the current design, run
+    OpenSTA, and ask Gemini for a fix until timing is met or iterations run
+    out. Returns (fix_history, best_index): one history entry per
+    Gemini-produced design, and the index of the best one (hold met
+    preferred, then highest setup slack), or None if history is empty.
+    """
+    original_design = design_content
+    current_design = design_content
+    fix_history = []
+    violations_history = []
+    prompt_cache = PromptCache.from_contents(design_content, liberty_content)
+
+    # LIDER_SPECULATE=1 overlaps Gemini and OpenSTA: the next fix request
+    # is launched in a background thread before the STA run, built from the
+    # previous iteration's log on the bet that violations persist. If STA
+    # comes back clean the speculative response is simply discarded.
+    speculate = os.environ.get("LIDER_SPECULATE", "0") != "0"
+    spec_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if speculate else None
+    speculative_fix = None
+
+    # Loop-invariant paths, computed once instead of per iteration
+    output_design_basename = os.path.basename(output_design_file)
+    liberty_copy = os.path.join(design_dir, liberty_name + ".lib")
+
+    # Best iteration tracked as a running max so no post-loop scan is needed
+    best_index = None
+    best_setup = -float('inf')
+    best_hold_ok = False
+
+    # Hashes of every design tried so far; a repeat from Gemini means no
+    # progress, and the STA run it would trigger is pure waste
+    seen_hashes = {hashlib.blake2b(design_content.encode(), digest_size=16).digest()}
+
+    for iteration in range(1, num_iterations + 1):
+        print(f"\n{'='*70}")
+        print(f"Iteration {iteration}/{num_iterations}")
+        print(f"{'='*70}")
+
+        # Save current design to iterations directory (iterations after the
+        # first were already persisted when their fix was accepted)
+        design_iter_file = os.path.join(iterations_dir, f"{design_name}_design_iteration_{iteration}.v")
+        if iteration == 1:
+            write_file(design_iter_file, current_design)
+        print(f"Saved design: {os.path.basename(design_iter_file)}")
+
+        # Update main design file for OpenSTA
+        write_file(output_design_file, current_design)
+
+        # Run OpenSTA
+        log_file = os.path.join(iterations_dir, f"{design_name}_sta_log_iteration_{iteration}.txt")
+        success, log_content, violations = run_opensta(tcl_file, log_file)
+
+        if not success or not log_content:
+            print(f"✗ OpenSTA execution failed in iteration {iteration}. Stopping.")
+            break
+
+        print(f"Saved STA log: {os.path.basename(log_file)}")
+
+        # Violations were parsed while the log streamed
+        violations_history.append(violations)
+
+        # Display violation status
+        print(f"\nTiming Status:")
+        if violations['worst_setup_slack'] is not None:
+            status = "VIOLATED" if violations['worst_setup_slack'] < 0 else "MET"
+            print(f"  Setup slack: {violations['worst_setup_slack']} ps ({status})")
+        if violations['worst_hold_slack'] is not None:
+            status = "VIOLATED" if violations['worst_hold_slack'] < 0 else "MET"
+            print(f"  Hold slack: {violations['worst_hold_slack']} ps ({status})")
+
+        # Check if violations are fixed
+        if not violations['has_violations']:
+            print(f"\n✓ SUCCESS: All timing violations fixed in iteration {iteration}!")
+            print(f"\n✓ Files saved for iteration {iteration}:")
+            print(f"  - Design: {os.path.basename(design_iter_file)}")
+            print(f"  - STA Log: {os.path.basename(log_file)}")
+            break
+
+        # If last iteration, stop
+        if iteration >= num_iterations:
+            print(f"\n⚠ Reached maximum iterations ({num_iterations}). Violations remain.")
+            print(f"\n✓ Files saved for iteration {iteration}:")
+            print(f"  - Design: {os.path.basename(design_iter_file)}")
+            print(f"  - STA Log: {os.path.basename(log_file)}")
+            break
+
+        # Request fixes from Gemini; with LIDER_CANDIDATES > 1, fan out one
+        # prompt per fix strategy and keep the candidate with the best slack
+        num_candidates = max(1, int(os.environ.get("LIDER_CANDIDATES", "1")))
+        if num_candidates > 1:
+            print(f"\nRequesting {num_candidates} candidate fixes from Gemini for iteration {iteration+1}...")
+            candidates = generate_candidate_fixes(
+                original_design, log_content, liberty_content, api_key,
+                fix_history=fix_history, iteration=iteration,
+                violations_history=violations_history,
+                num_candidates=num_candidates,
+                prompt_cache=prompt_cache
+            )
+            if not candidates:
+                print("⚠ Warning: Could not extract Verilog code from Gemini's responses.")
+                break
+
+            candidates_root = os.path.join(iterations_dir, f"iteration_{iteration}_candidates")
+            best_candidate, _, _ = evaluate_candidate_designs(
+                [design for design, _ in candidates], candidates_root,
+                output_design_basename, tcl_file, sdc_file, liberty_copy
+            )
+            if best_candidate is None:
+                best_candidate = 0
+            extracted_verilog, fixed_design_response = candidates[best_candidate]
+            print(f"Selected candidate {best_candidate + 1} of {len(candidates)}")
+        else:
+            if speculative_fix is not None:
+                print(f"\nCollecting speculative Gemini fix requested during the STA run...")
+                fixed_design_response = speculative_fix.result()
+                speculative_fix = None
+            else:
+                print(f"\nRequesting design fixes from Gemini for iteration {iteration+1}...")
+                fixed_design_response = fix_timing_violations_with_gemini(
+                    original_design,
+                    log_content,
+                    liberty_content,
+                    api_key,
+                    fix_history=fix_history,
+                    iteration=iteration,
+                    violations_history=violations_history,
+                    prompt_cache=prompt_cache
+                )
+            extracted_verilog = extract_verilog_code(fixed_design_response)
+
+        # Save Gemini response
+        response_file = os.path.join(iterations_dir, f"{design_name}_gemini_response_iteration_{iteration}.txt")
+        write_file(response_file, fixed_design_response)
+        print(f"Saved Gemini response: {os.path.basename(response_file)}")
+
+        if not extracted_verilog:
+            print("⚠ Warning: Could not extract Verilog code from Gemini's response.")
+            break
+
+        design_hash = hashlib.blake2b(extracted_verilog.encode(), digest_size=16).digest()
+        if design_hash in seen_hashes:
+            print("⚠ Gemini returned a design already tried. Stopping — no progress.")
+            break
+        seen_hashes.add(design_hash)
+
+        # Summarize changes
+        changes_summary = summarize_changes(current_design, extracted_verilog)
+        print(f"Changes: {changes_summary}")
+
+        # Update current design
+        current_design = extracted_verilog
+
+        # Persist the accepted fix now and record only its path: history
+        # entries stay O(1) in memory instead of holding every netlist.
+        next_design_file = os.path.join(iterations_dir, f"{design_name}_design_iteration_{iteration + 1}.v")
+        write_file(next_design_file, extracted_verilog)
+
+        # Add to history
+        fix_history.append({
+            'path': next_design_file,
+            'changes': changes_summary,
+            'setup_slack': violations['worst_setup_slack'],
+            'hold_slack': violations['worst_hold_slack']
+        })
+
+        # Update the running best: an entry that meets hold beats any that
+        # does not; ties are broken by setup slack
+        setup_slack = violations['worst_setup_slack']
+        hold_slack = violations['worst_hold_slack']
+        hold_ok = hold_slack is None or hold_slack >= 0
+        if setup_slack is not None and (
+                (hold_ok and not best_hold_ok)
+                or (hold_ok == best_hold_ok and setup_slack > best_setup)):
+            best_index = len(fix_history) - 1
+            best_setup = setup_slack
+            best_hold_ok = hold_ok
+
+        # Kick off the next fix request now so it runs while the next
+        # iteration's OpenSTA is busy. It sees the current (stale) log,
+        # which is the price of the overlap. The tight deadline keeps a
+        # discarded speculation from holding the worker thread — and with
+        # it process exit — hostage through minutes of retries.
+        if spec_executor is not None and num_candidates == 1 and iteration + 1 < num_iterations:
+            speculative_fix = spec_executor.submit(
+                fix_timing_violations_with_gemini,
+                original_design, log_content, liberty_content, api_key,
+                fix_history=list(fix_history), iteration=iteration + 1,
+                violations_history=list(violations_history),
+                prompt_cache=prompt_cache,
+                deadline=time.monotonic() + 60
+            )
+
+        print(f"\n✓ Files saved for iteration {iteration}:")
+        print(f"  - Design: {os.path.basename(design_iter_file)}")
+        print(f"  - STA Log: {os.path.basename(log_file)}")
+        print(f"  - Gemini Response: {os.path.basename(response_file)}")
+
+    if spec_executor is not None:
+        spec_executor.shutdown(wait=False, cancel_futures=True)
+
+    return fix_history, best_index
+
+# ------------------------- Batch Directory Mode -------------------------
+
+def _prepare_design_outputs(design_file, design_content, liberty_file, sdc_requirement,
+                            base_dir, verilog_analysis, liberty_analysis, response):
+    """Write the analysis, SDC and TCL outputs for one design; returns (name, tcl, log) for STA."""
+    design_name = os.path.splitext(os.path.basename(design_file))[0]
+    design_dir = os.path.join(base_dir, design_name)
+    os.makedirs(design_dir, exist_ok=True)
+
+    write_file(os.path.join(design_dir, f"{design_name}_verilog_analysis.txt"), verilog_analysis)
+    write_file(os.path.join(design_dir, f"{design_name}_liberty_analysis.txt"), liberty_analysis)
+
+    output_design_file = os.path.join(design_dir, os.path.basename(design_file))
+    sdc_file = os.path.join(design_dir, f"{design_name}.sdc")
+    tcl_file = os.path.join(design_dir, f"{design_name}.tcl")
+    liberty_filename = os.path.basename(liberty_file)
+    liberty_name = os.path.splitext(liberty_filename)[0]
+
+    if not os.path.exists(output_design_file):
+        fast_copy(design_file, output_design_file)
+    fast_copy(liberty_file, os.path.join(design_dir, liberty_name + ".lib"))
+
+    top_module = get_top_module_name(design_content)
+
+    sdc_code = post_process_sdc(extract_sdc_code(response), sdc_requirement)
+    tcl_code = extract_tcl_code(response)
+
+    if not tcl_code or liberty_filename not in tcl_code:
+        tcl_code = create_default_tcl(os.path.basename(output_design_file),
+                                      os.path.basename(sdc_file),
+                                      liberty_filename,
+                                      top_module)
+    else:
+        tcl_code = post_process_tcl(tcl_code, top_module,
+                                    os.path.basename(sdc_file),
+                                    liberty_filename)
+
+    write_file(sdc_file, sdc_code)
+    write_file(tcl_file, tcl_code)
+    write_file(os.path.join(design_dir, "gemini_sdc_tcl_generation.txt"), response)
+
+    log_file = os.path.join(design_dir, f"{design_name}_sta_log.txt")
+    return design_name, tcl_file, log_file
+
+def run_batch_directory(designs_dir, liberty_file, sdc_requirement_file, api_key, base_dir):
+    """
+    Process every .v design in a directory: designs are read and filtered in
+    a thread pool, all Gemini analyses go out as one prompt batch, and the
+    OpenSTA runs fan out across designs on a process pool.
+    """
+    sdc_requirement = read_file(sdc_requirement_file)
+    if not sdc_requirement:
+        print("Error: Could not read SDC requirements file. Exiting.")
+        return
+
+    try:
+        design_files = sorted(
+            os.path.join(designs_dir, name)
+            for name in os.listdir(designs_dir) if name.endswith(".v")
+        )
+    except OSError as e:
+        print(f"Error reading directory {designs_dir}: {e}")
+        return
+
+    if not design_files:
+        print(f"No .v design files found in {designs_dir}.")
+        return
+
+    liberty_filename = os.path.basename(liberty_file)
+
+    # Stage 1: read designs and filter the liberty per design
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        contents = list(executor.map(read_file, design_files))
+        filtered_libs = list(executor.map(
+            lambda content: get_minimal_liberty_for_timing_fixes(content, liberty_path=liberty_file)
+            if content else None,
+            contents
+        ))
+
+    designs = [(design_file, content, filtered)
+               for design_file, content, filtered in zip(design_files, contents, filtered_libs)
+               if content and filtered]
+    if not designs:
+        print("Error: Could not read any design with the given liberty file. Exiting.")
+        return
+
+    # Stage 2: one Gemini submission for all designs (3 prompts each, demuxed by index)
+    prompts = []
+    for _, content, filtered in designs:
+        prompts.append(build_verilog_analysis_prompt(content))
+        prompts.append(build_liberty_analysis_prompt(content, filtered))
+        prompts.append(create_initial_prompt(content, sdc_requirement, liberty_filename))
+
+    print(f"Submitting {len(prompts)} Gemini prompts for {len(designs)} designs...")
+    responses = query_gemini_batch(prompts, api_key)
+
+    # Stage 3: write outputs per design, then fan out OpenSTA across designs
+    sta_jobs = []
+    for i, (design_file, content, _) in enumerate(designs):
+        verilog_analysis, liberty_analysis, response = responses[3 * i:3 * i + 3]
+        sta_jobs.append(_prepare_design_outputs(
+            design_file, content, liberty_file, sdc_requirement,
+            base_dir, verilog_analysis, liberty_analysis, response
+        ))
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {executor.submit(run_opensta, tcl_file, log_file): design_name
+                   for design_name, tcl_file, log_file in sta_jobs}
+        for future in concurrent.futures.as_completed(futures):
+            design_name = futures[future]
+            try:
+                results[design_name] = future.result()
+            except Exception as e:
+                print(f"✗ OpenSTA run for {design_name} failed: {e}")
+                results[design_name] = (False, None, None)
+
+    print("\n" + "=" * 80)
+    print("BATCH COMPLETE")
+    print("=" * 80)
+    for design_name, _, _ in sta_jobs:
+        success, _, violations = results.get(design_name, (False, None, None))
+        if success and violations:
+            print(f"  {design_name}: setup slack={violations['worst_setup_slack']} ps, "
+                  f"hold slack={violations['worst_hold_slack']} ps")
+        else:
+            print(f"  {design_name}: STA failed")
+    print(f"\nAll files saved under: {base_dir}")
 
 # ------------------------- Main Function -------------------------
 
 def main():
+    # Command-line arguments make headless runs possible (benchmark sweeps,
+    # CI); anything not supplied falls back to the interactive prompts.
+    parser = argparse.ArgumentParser(description="OpenSTA automation with Gemini assistance")
+    parser.add_argument("--design", help="path to the Verilog design file")
+    parser.add_argument("--liberty", help="path to the liberty file")
+    parser.add_argument("--sdc-req", dest="sdc_req", help="path to the English SDC requirements file")
+    parser.add_argument("--iterations", type=int, help="maximum number of fix iterations")
+    parser.add_argument("--choice", choices=["1", "2", "3", "4", "5", "6"], help="menu option, skipping the menu")
+    parser.add_argument("--api-key", dest="api_key", help="Gemini API key (or set GEMINI_API_KEY)")
+    parser.add_argument("--batch", help="directory of .v designs to process (implies choice 6)")
+    args = parser.parse_args()
+
     print("=" * 80)
     print("OpenSTA Automation with Gemini API")
     print("=" * 80)
-    
-    api_key = input("ADD YOUR GEMINI API KEY")
-    
-    print("\nWhat help do you want from our tool?")
-    print("Options:")
-    print("1) Verilog Design Analysis")
-    print("2) Liberty File Analysis for Design Cells")
-    print("3) SDC & TCL Generation")
-    print("4) Timing Analysis & Violation Fixing (Combined)")
-    print("5) Run all")
-    
-    choice = input("\nEnter your choice (1-5): ")
-    
+
+    api_key = args.api_key or os.environ.get("GEMINI_API_KEY") or input("ADD YOUR GEMINI API KEY")
+
+    if args.batch:
+        choice = "6"
+    elif args.choice:
+        choice = args.choice
+    else:
+        print("\nWhat help do you want from our tool?")
+        print("Options:")
+        print("1) Verilog Design Analysis")
+        print("2) Liberty File Analysis for Design Cells")
+        print("3) SDC & TCL Generation")
+        print("4) Timing Analysis & Violation Fixing (Combined)")
+        print("5) Run all")
+        print("6) Batch directory (process every .v design in a folder)")
+
+        choice = input("\nEnter your choice (1-6): ")
+
     base_dir = os.path.join("Gemini_Response", "OpenSTA")
     os.makedirs(base_dir, exist_ok=True)
     
     if choice == "1":  # Verilog Design Analysis
-        design_file = input("Enter the path to your Verilog design file: ")
+        design_file = args.design or input("Enter the path to your Verilog design file: ")
         design_content = read_file(design_file)
         
         if not design_content:
@@ -666,30 +1704,27 @@ def main():
         print(f"Analysis saved to: {verilog_analysis_file}")
     
     elif choice == "2":  # Liberty File Analysis
-        design_file = input("Enter the path to your Verilog design file: ")
-        liberty_file = input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
+        design_file = args.design or input("Enter the path to your Verilog design file: ")
+        liberty_file = args.liberty or input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
         if not liberty_file:
             liberty_file = "NangateOpenCellLibrary_typical.lib"
         
         design_content = read_file(design_file)
-        liberty_content = read_file(liberty_file)
-        
+        # Filter the liberty file straight from disk (mmap) instead of slurping it
+        liberty_content = get_minimal_liberty_for_timing_fixes(design_content, liberty_path=liberty_file) if design_content else None
+
         if not design_content or not liberty_content:
             print("Error: Could not read required files. Exiting.")
             return
-        
+
         design_name = os.path.splitext(os.path.basename(design_file))[0]
         design_dir = os.path.join(base_dir, design_name)
         os.makedirs(design_dir, exist_ok=True)
-        
+
         print("\n" + "=" * 80)
         print("Liberty File Analysis")
         print("=" * 80)
         
-        # Filter liberty file
-        filtered_lib = get_minimal_liberty_for_timing_fixes(design_content, liberty_content)
-        liberty_content = filtered_lib
-        
         print("Requesting Liberty file analysis from Gemini...")
         liberty_analysis = analyze_liberty_with_gemini(design_content, liberty_content, api_key)
         
@@ -702,16 +1737,17 @@ def main():
         print(f"Analysis saved to: {liberty_analysis_file}")
     
     elif choice == "3":  # SDC & TCL Generation
-        design_file = input("Enter the path to your Verilog design file: ")
-        liberty_file = input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
+        design_file = args.design or input("Enter the path to your Verilog design file: ")
+        liberty_file = args.liberty or input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
         if not liberty_file:
             liberty_file = "NangateOpenCellLibrary_typical.lib"
-        sdc_requirement_file = input("Enter the path to your English SDC requirements file: ")
+        sdc_requirement_file = args.sdc_req or input("Enter the path to your English SDC requirements file: ")
         
         design_content = read_file(design_file)
-        liberty_content = read_file(liberty_file)
+        # Only a readability check — the prompt and TCL reference the liberty by name
+        liberty_content = read_file(liberty_file, max_bytes=4096)
         sdc_requirement = read_file(sdc_requirement_file)
-        
+
         if not design_content or not liberty_content or not sdc_requirement:
             print("Error: Could not read required files. Exiting.")
             return
@@ -728,17 +1764,17 @@ def main():
         sdc_file = os.path.join(design_dir, f"{design_name}.sdc")
         tcl_file = os.path.join(design_dir, f"{design_name}.tcl")
         
-        liberty_name = os.path.splitext(os.path.basename(liberty_file))[0]
-        
+        liberty_filename = os.path.basename(liberty_file)
+        liberty_name = os.path.splitext(liberty_filename)[0]
+
         # Copy files
         if not os.path.exists(output_design_file):
-            shutil.copy2(design_file, output_design_file)
-        shutil.copy2(liberty_file, os.path.join(design_dir, liberty_name + ".lib"))
-        
+            fast_copy(design_file, output_design_file)
+        fast_copy(liberty_file, os.path.join(design_dir, liberty_name + ".lib"))
+
         # Generate SDC and TCL
         top_module = get_top_module_name(design_content)
-        liberty_filename = os.path.basename(liberty_file)
-        
+
         prompt = create_initial_prompt(design_content, sdc_requirement, liberty_filename)
         print("Generating SDC and TCL files using Gemini...")
         
@@ -774,18 +1810,17 @@ def main():
         print(f"  - Gemini Response: gemini_sdc_tcl_generation.txt")
     
     elif choice == "4":  # Timing Analysis & Violation Fixing
-        design_file = input("Enter the path to your Verilog design file: ")
-        liberty_file = input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
+        design_file = args.design or input("Enter the path to your Verilog design file: ")
+        liberty_file = args.liberty or input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
         if not liberty_file:
             liberty_file = "NangateOpenCellLibrary_typical.lib"
-        sdc_requirement_file = input("Enter the path to your English SDC requirements file: ")
+        sdc_requirement_file = args.sdc_req or input("Enter the path to your English SDC requirements file: ")
         
         design_content = read_file(design_file)
-        liberty_content = read_file(liberty_file)
-        filtered_lib = get_minimal_liberty_for_timing_fixes(design_content, liberty_content)
-        liberty_content = filtered_lib
+        # Filter the liberty file straight from disk (mmap) instead of slurping it
+        liberty_content = get_minimal_liberty_for_timing_fixes(design_content, liberty_path=liberty_file) if design_content else None
         sdc_requirement = read_file(sdc_requirement_file)
-        
+
         if not design_content or not liberty_content or not sdc_requirement:
             print("Error: Could not read required files. Exiting.")
             return
@@ -799,15 +1834,15 @@ def main():
         sdc_file = os.path.join(design_dir, f"{design_name}.sdc")
         tcl_file = os.path.join(design_dir, f"{design_name}.tcl")
         
-        liberty_name = os.path.splitext(os.path.basename(liberty_file))[0]
-        
+        liberty_filename = os.path.basename(liberty_file)
+        liberty_name = os.path.splitext(liberty_filename)[0]
+
         if not os.path.exists(output_design_file):
-            shutil.copy2(design_file, output_design_file)
-        shutil.copy2(liberty_file, os.path.join(design_dir, liberty_name + ".lib"))
-        
+            fast_copy(design_file, output_design_file)
+        fast_copy(liberty_file, os.path.join(design_dir, liberty_name + ".lib"))
+
         top_module = get_top_module_name(design_content)
-        liberty_filename = os.path.basename(liberty_file)
-        
+
         # Check if SDC and TCL already exist, otherwise generate
         if not os.path.exists(sdc_file) or not os.path.exists(tcl_file):
             print("Generating SDC and TCL files...")
@@ -838,83 +1873,17 @@ def main():
         
         # Ask for iterations
         try:
-            num_iterations = int(input("Enter the maximum number of iterations (default: 3): ") or 3)
+            num_iterations = args.iterations or int(input("Enter the maximum number of iterations (default: 3): ") or 3)
         except ValueError:
             num_iterations = 3
         
         iterations_dir = os.path.join(design_dir, "sta_violation_fixes")
         os.makedirs(iterations_dir, exist_ok=True)
-        
-        original_design = design_content
-        current_design = design_content
-        fix_history = []
-        violations_history = []
-        
-        for iteration in range(1, num_iterations + 1):
-            print(f"\n{'='*70}")
-            print(f"Iteration {iteration}/{num_iterations}")
-            print(f"{'='*70}")
-            
-            design_iter_file = os.path.join(iterations_dir, f"{design_name}_design_iteration_{iteration}.v")
-            write_file(design_iter_file, current_design)
-            
-            write_file(output_design_file, current_design)
-            
-            log_file = os.path.join(iterations_dir, f"{design_name}_sta_log_iteration_{iteration}.txt")
-            success, log_content = run_opensta(tcl_file, log_file)
-            
-            if not success or not log_content:
-                print(f"✗ OpenSTA failed. Stopping.")
-                break
-            
-            violations = parse_log_for_timing_violations(log_content)
-            violations_history.append(violations)
-            
-            print(f"\nTiming Status:")
-            if violations['worst_setup_slack'] is not None:
-                status = "VIOLATED" if violations['worst_setup_slack'] < 0 else "MET"
-                print(f"  Setup slack: {violations['worst_setup_slack']} ps ({status})")
-            if violations['worst_hold_slack'] is not None:
-                status = "VIOLATED" if violations['worst_hold_slack'] < 0 else "MET"
-                print(f"  Hold slack: {violations['worst_hold_slack']} ps ({status})")
-            
-            if not violations['has_violations']:
-                print(f"\n✓ All violations fixed!")
-                break
-            
-            if iteration >= num_iterations:
-                print(f"\n⚠ Maximum iterations reached.")
-                break
-            
-            print(f"\nRequesting fixes from Gemini...")
-            
-            fixed_design_response = fix_timing_violations_with_gemini(
-                original_design, log_content, liberty_content, api_key,
-                fix_history=fix_history, iteration=iteration,
-                violations_history=violations_history
-            )
-            
-            response_file = os.path.join(iterations_dir, f"{design_name}_gemini_response_iteration_{iteration}.txt")
-            write_file(response_file, fixed_design_response)
-            
-            extracted_verilog = extract_verilog_code(fixed_design_response)
-            
-            if not extracted_verilog:
-                print("⚠ Could not extract Verilog code.")
-                break
-            
-            changes_summary = summarize_changes(current_design, extracted_verilog)
-            print(f"Changes: {changes_summary}")
-            
-            current_design = extracted_verilog
-            
-            fix_history.append({
-                'design': extracted_verilog,
-                'changes': changes_summary,
-                'setup_slack': violations['worst_setup_slack'],
-                'hold_slack': violations['worst_hold_slack']
-            })
-        
+
+        run_fix_iterations(design_content, liberty_content, api_key, design_name,
+                           design_dir, iterations_dir, output_design_file,
+                           tcl_file, sdc_file, liberty_name, num_iterations)
+
         print("\n" + "=" * 80)
         print("ANALYSIS COMPLETE")
         print("=" * 80)
@@ -922,18 +1891,17 @@ def main():
     
     elif choice == "5":  # Run all
         # Collect all required files
-        design_file = input("Enter the path to your Verilog design file: ")
-        liberty_file = input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
+        design_file = args.design or input("Enter the path to your Verilog design file: ")
+        liberty_file = args.liberty or input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
         if not liberty_file:
             liberty_file = "NangateOpenCellLibrary_typical.lib"
-        sdc_requirement_file = input("Enter the path to your English SDC requirements file: ")
+        sdc_requirement_file = args.sdc_req or input("Enter the path to your English SDC requirements file: ")
         
-        # Read file contents
+        # Read file contents; filter the liberty file straight from disk (mmap)
         design_content = read_file(design_file)
-        liberty_content = read_file(liberty_file)
-        filtered_lib = get_minimal_liberty_for_timing_fixes(design_content, liberty_content)
-        write_file("liberty_shortened.lib", filtered_lib)
-        liberty_content = filtered_lib
+        liberty_content = get_minimal_liberty_for_timing_fixes(design_content, liberty_path=liberty_file) if design_content else None
+        if liberty_content:
+            write_file("liberty_shortened.lib", liberty_content)
 
         sdc_requirement = read_file(sdc_requirement_file)
         
@@ -946,14 +1914,25 @@ def main():
         design_dir = os.path.join(base_dir, design_name)
         os.makedirs(design_dir, exist_ok=True)
         
+        # Build the three independent Gemini prompts up front so the network
+        # waits overlap instead of adding up.
+        top_module = get_top_module_name(design_content)
+        liberty_filename = os.path.basename(liberty_file)
+
+        analysis_prompts = [
+            build_verilog_analysis_prompt(design_content),
+            build_liberty_analysis_prompt(design_content, liberty_content),
+            create_initial_prompt(design_content, sdc_requirement, liberty_filename),
+        ]
+
+        print("\nRequesting Verilog analysis, Liberty analysis and SDC/TCL generation from Gemini concurrently...")
+        verilog_analysis, liberty_analysis, response = query_gemini_batch(analysis_prompts, api_key)
+
         # ==================== STEP 1: Verilog Design Analysis ====================
         print("\n" + "=" * 80)
         print("STEP 1: Verilog Design Analysis")
         print("=" * 80)
-        
-        print("Requesting Verilog analysis from Gemini...")
-        verilog_analysis = analyze_verilog_with_gemini(design_content, api_key)
-        
+
         verilog_analysis_file = os.path.join(design_dir, f"{design_name}_verilog_analysis.txt")
         write_file(verilog_analysis_file, verilog_analysis)
         
@@ -967,10 +1946,7 @@ def main():
         print("\n" + "=" * 80)
         print("STEP 2: Liberty File Analysis")
         print("=" * 80)
-        
-        print("Requesting Liberty file analysis from Gemini...")
-        liberty_analysis = analyze_liberty_with_gemini(design_content, liberty_content, api_key)
-        
+
         liberty_analysis_file = os.path.join(design_dir, f"{design_name}_liberty_analysis.txt")
         write_file(liberty_analysis_file, liberty_analysis)
         
@@ -989,24 +1965,16 @@ def main():
         sdc_file = os.path.join(design_dir, f"{design_name}.sdc")
         tcl_file = os.path.join(design_dir, f"{design_name}.tcl")
 
-        liberty_name = os.path.splitext(os.path.basename(liberty_file))[0]
+        liberty_name = os.path.splitext(liberty_filename)[0]
 
         # Copy files
         if not os.path.exists(output_design_file):
-            shutil.copy2(design_file, output_design_file)
+            fast_copy(design_file, output_design_file)
             print(f"Copied design file to {output_design_file}")
-        shutil.copy2(liberty_file, os.path.join(design_dir, liberty_name + ".lib"))
+        fast_copy(liberty_file, os.path.join(design_dir, liberty_name + ".lib"))
         print(f"Copied liberty file to {os.path.join(design_dir, liberty_name + '.lib')}")
-        
-        # Generate SDC and TCL files
-        top_module = get_top_module_name(design_content)
-        liberty_filename = os.path.basename(liberty_file)
-        
-        prompt = create_initial_prompt(design_content, sdc_requirement, liberty_filename)
-        print("Generating initial SDC and TCL files using Gemini...")
-        
-        response = query_gemini(prompt, api_key)
-        
+
+        # Generate SDC and TCL files from the response fetched alongside the analyses
         sdc_code = extract_sdc_code(response)
         tcl_code = extract_tcl_code(response)
         
@@ -1037,7 +2005,7 @@ def main():
         
         # Ask for number of iterations
         try:
-            num_iterations = int(input("Enter the maximum number of iterations (default: 3): ") or 3)
+            num_iterations = args.iterations or int(input("Enter the maximum number of iterations (default: 3): ") or 3)
         except ValueError:
             num_iterations = 3
             print("Invalid input. Using default value of 3 iterations.")
@@ -1045,128 +2013,15 @@ def main():
         # Create subdirectory for iterations
         iterations_dir = os.path.join(design_dir, "sta_violation_fixes")
         os.makedirs(iterations_dir, exist_ok=True)
-        
-        # Track history
-        original_design = design_content
-        current_design = design_content
-        fix_history = []
-        violations_history = []
-        
-        # Run iterative STA + violation fixing
-        for iteration in range(1, num_iterations + 1):
-            print(f"\n{'='*70}")
-            print(f"Iteration {iteration}/{num_iterations}")
-            print(f"{'='*70}")
-            
-            # Save current design to iterations directory
-            design_iter_file = os.path.join(iterations_dir, f"{design_name}_design_iteration_{iteration}.v")
-            write_file(design_iter_file, current_design)
-            print(f"Saved design: {os.path.basename(design_iter_file)}")
-            
-            # Update main design file for OpenSTA
-            write_file(output_design_file, current_design)
-            
-            # Run OpenSTA
-            log_file = os.path.join(iterations_dir, f"{design_name}_sta_log_iteration_{iteration}.txt")
-            success, log_content = run_opensta(tcl_file, log_file)
-            
-            if not success or not log_content:
-                print(f"✗ OpenSTA execution failed in iteration {iteration}. Stopping.")
-                break
-            
-            print(f"Saved STA log: {os.path.basename(log_file)}")
-            
-            # Parse for violations
-            violations = parse_log_for_timing_violations(log_content)
-            violations_history.append(violations)
-            
-            # Display violation status
-            print(f"\nTiming Status:")
-            if violations['worst_setup_slack'] is not None:
-                status = "VIOLATED" if violations['worst_setup_slack'] < 0 else "MET"
-                print(f"  Setup slack: {violations['worst_setup_slack']} ps ({status})")
-            if violations['worst_hold_slack'] is not None:
-                status = "VIOLATED" if violations['worst_hold_slack'] < 0 else "MET"
-                print(f"  Hold slack: {violations['worst_hold_slack']} ps ({status})")
-            
-            # Check if violations are fixed
-            if not violations['has_violations']:
-                print(f"\n✓ SUCCESS: All timing violations fixed in iteration {iteration}!")
-                print(f"\n✓ Files saved for iteration {iteration}:")
-                print(f"  - Design: {os.path.basename(design_iter_file)}")
-                print(f"  - STA Log: {os.path.basename(log_file)}")
-                break
-            
-            # If last iteration, stop
-            if iteration >= num_iterations:
-                print(f"\n⚠ Reached maximum iterations ({num_iterations}). Violations remain.")
-                print(f"\n✓ Files saved for iteration {iteration}:")
-                print(f"  - Design: {os.path.basename(design_iter_file)}")
-                print(f"  - STA Log: {os.path.basename(log_file)}")
-                break
-            
-            # Request fixes from Gemini
-            print(f"\nRequesting design fixes from Gemini for iteration {iteration+1}...")
-            
-            fixed_design_response = fix_timing_violations_with_gemini(
-                original_design, 
-                log_content, 
-                liberty_content, 
-                api_key,
-                fix_history=fix_history,
-                iteration=iteration,
-                violations_history=violations_history
-            )
-            
-            # Save Gemini response
-            response_file = os.path.join(iterations_dir, f"{design_name}_gemini_response_iteration_{iteration}.txt")
-            write_file(response_file, fixed_design_response)
-            print(f"Saved Gemini response: {os.path.basename(response_file)}")
-            
-            # Extract fixed Verilog code
-            extracted_verilog = extract_verilog_code(fixed_design_response)
-            
-            if not extracted_verilog:
-                print("⚠ Warning: Could not extract Verilog code from Gemini's response.")
-                break
-            
-            # Summarize changes
-            changes_summary = summarize_changes(current_design, extracted_verilog)
-            print(f"Changes: {changes_summary}")
-            
-            # Update current design
-            current_design = extracted_verilog
-            
-            # Add to history
-            fix_history.append({
-                'design': extracted_verilog,
-                'changes': changes_summary,
-                'setup_slack': violations['worst_setup_slack'],
-                'hold_slack': violations['worst_hold_slack']
-            })
-            
-            print(f"\n✓ Files saved for iteration {iteration}:")
-            print(f"  - Design: {os.path.basename(design_iter_file)}")
-            print(f"  - STA Log: {os.path.basename(log_file)}")
-            print(f"  - Gemini Response: {os.path.basename(response_file)}")
-        
-        # Determine best iteration
-        if fix_history:
-            best_iteration = 0
-            best_setup_slack = -float('inf')
-            
-            for i, hist in enumerate(fix_history):
-                if 'hold_slack' not in hist or hist['hold_slack'] is None or hist['hold_slack'] >= 0:
-                    if hist['setup_slack'] > best_setup_slack:
-                        best_setup_slack = hist['setup_slack']
-                        best_iteration = i
-            
-            if best_setup_slack == -float('inf'):
-                for i, hist in enumerate(fix_history):
-                    if hist['setup_slack'] > best_setup_slack:
-                        best_setup_slack = hist['setup_slack']
-                        best_iteration = i
-            
+
+        # Run iterative STA + violation fixing; the best iteration is
+        # tracked inline by the loop, so no post-scan is needed here
+        fix_history, best_iteration = run_fix_iterations(design_content, liberty_content, api_key,
+                                                         design_name, design_dir, iterations_dir,
+                                                         output_design_file, tcl_file, sdc_file,
+                                                         liberty_name, num_iterations)
+
+        if fix_history and best_iteration is not None:
             print(f"\n{'='*70}")
             print(f"Best results from iteration {best_iteration+1}:")
             print(f"  Setup slack: {fix_history[best_iteration]['setup_slack']} ps")
@@ -1175,7 +2030,7 @@ def main():
             
             # Save best design to main directory
             best_design_file = os.path.join(design_dir, f"{design_name}_best_fixed_design.v")
-            write_file(best_design_file, fix_history[best_iteration]['design'])
+            fast_copy(fix_history[best_iteration]['path'], best_design_file)
             print(f"\nBest design saved to: {os.path.basename(best_design_file)}")
         
         # Final Summary
@@ -1192,8 +2047,17 @@ def main():
         if fix_history:
             print(f"6. Best Design: {design_name}_best_fixed_design.v")
     
+    elif choice == "6":  # Batch directory
+        designs_dir = args.batch or input("Enter the directory containing your Verilog design files: ")
+        liberty_file = args.liberty or input("Enter the path to your liberty file (default: NangateOpenCellLibrary_typical.lib): ")
+        if not liberty_file:
+            liberty_file = "NangateOpenCellLibrary_typical.lib"
+        sdc_requirement_file = args.sdc_req or input("Enter the path to your English SDC requirements file: ")
+
+        run_batch_directory(designs_dir, liberty_file, sdc_requirement_file, api_key, base_dir)
+
     else:
-        print("Invalid choice. Please run the script again and select 1-5.")
+        print("Invalid choice. Please run the script again and select 1-6.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file